@@ -6,7 +6,7 @@ A personal voice assistant that learns and remembers you.
 Powered by:
 - LiveKit Agents - Real-time voice AI framework
 - Fish Audio - Natural text-to-speech
-- OpenAI - LLM (GPT-4o-mini) and STT (Whisper)
+- OpenAI - LLM (GPT-4o-mini) and streaming STT (gpt-4o-mini-transcribe)
 - Mem0 AI - Intelligent memory system
 - Silero - Voice activity detection
 
@@ -22,8 +22,10 @@ License: MIT
 """
 
 import asyncio
+import functools
 import os
 import logging
+from typing import Optional
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
@@ -41,7 +43,9 @@ from livekit.plugins.fishaudio import TTS as FishAudioTTS
 # Local modules
 from tools import check_read_books, get_book_details, web_search
 from memory_system import (
-    mem0_learn_from_conversation,
+    mem0_aclose,
+    mem0_ensure_ready,
+    mem0_learning_worker,
     mem0_get_all,
     mem0_forget_all,
     mem0_get_context,
@@ -55,6 +59,34 @@ if not logger.handlers:
         format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
     )
 
+# Faster libuv-based event loop where available (not on Windows).
+# Installed at import so LiveKit's job processes pick it up too.
+try:
+    import uvloop
+    asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+except ImportError:
+    pass
+
+# Max time to wait for prefetched memory context before replying without it
+MEMORY_CONTEXT_TIMEOUT = 0.4
+
+# Speculative memory prefetch on interim transcripts: only once the partial
+# is long enough, and only re-issue when it drifted by more than N characters
+SPECULATIVE_MIN_CHARS = 15
+SPECULATIVE_MIN_DRIFT = 5
+
+
+@functools.lru_cache(maxsize=1)
+def _vad() -> silero.VAD:
+    """Load the Silero VAD model once per process and share it across sessions."""
+    return silero.VAD.load()
+
+
+def _transcript_drift(old: str, new: str) -> int:
+    """Cheap upper bound on the edit distance between two transcripts."""
+    common = len(os.path.commonprefix([old, new]))
+    return len(old) + len(new) - 2 * common
+
 
 class MelissaAssistant(Agent):
     """
@@ -96,17 +128,68 @@ PERSONALITY:
 - Keep responses brief (voice interaction)
 - Reference things you remember naturally
 """,
-            stt=openai.STT(language="en"),  # OpenAI Whisper - English only
+            # Streaming transcription (realtime API) - English only.
+            # Interim transcripts drive the speculative memory prefetch.
+            stt=openai.STT(
+                language="en",
+                model="gpt-4o-mini-transcribe",
+                use_realtime=True,
+            ),
             llm=openai.LLM(model="gpt-4o-mini"),
             tts=FishAudioTTS(
                 api_key=os.environ.get("FISH_AUDIO_API_KEY"),
                 reference_id=os.environ.get("FISH_AUDIO_VOICE_ID"),
                 model="s1",
+                # "balanced" is Fish Audio's low-latency mode ("normal" favours
+                # quality); audio is streamed back in chunks as it's generated
                 latency_mode="balanced",
                 sample_rate=24000,
             ),
-            vad=silero.VAD.load(),  # Voice Activity Detection
+            vad=_vad(),  # Voice Activity Detection
         )
+        # Memory lookup started as soon as the final transcript arrives
+        self._context_query = ""
+        self._context_task: Optional[asyncio.Task] = None
+
+    # ========== MEMORY CONTEXT PREFETCH ==========
+    
+    def prefetch_memory_context(self, query: str, is_final: bool = True) -> None:
+        """
+        Start fetching memory context for a transcript in the background.
+        
+        Called with interim transcripts too, so the embedding + vector search
+        usually finishes before the user stops talking. A lookup already in
+        flight is kept while the transcript only changes slightly.
+        """
+        task = self._context_task
+        if task and not task.cancelled() and \
+                _transcript_drift(self._context_query, query) <= SPECULATIVE_MIN_DRIFT:
+            if is_final:
+                # Close enough - let the final transcript claim this lookup
+                self._context_query = query
+            return
+        if not is_final and len(query) <= SPECULATIVE_MIN_CHARS:
+            return
+        
+        if task and not task.done():
+            task.cancel()
+        self._context_query = query
+        self._context_task = asyncio.create_task(mem0_get_context(query))
+    
+    async def _take_memory_context(self, user_text: str) -> str:
+        """Return the prefetched context for user_text, or fetch it now."""
+        task, self._context_task = self._context_task, None
+        if task is None or self._context_query != user_text:
+            if task:
+                task.cancel()
+            return await mem0_get_context(user_text)
+        
+        try:
+            # Shielded: a late lookup still finishes and fills the context cache
+            return await asyncio.wait_for(asyncio.shield(task), timeout=MEMORY_CONTEXT_TIMEOUT)
+        except asyncio.TimeoutError:
+            logger.warning("⏱️ Memory context not ready in time, replying without it")
+            return ""
 
     # ========== MEMORY CONTEXT INJECTION ==========
     
@@ -123,13 +206,13 @@ PERSONALITY:
         if not user_text:
             return
         
-        logger.info(f"🧠 Retrieving memory context for: '{user_text[:50]}...'")
+        logger.info("🧠 Retrieving memory context for: '%.50s...'", user_text)
         
-        # Get relevant memories from Mem0
-        memory_context = await mem0_get_context(user_text)
+        # Get relevant memories from Mem0 (usually already prefetched)
+        memory_context = await self._take_memory_context(user_text)
         
         if memory_context:
-            logger.info(f"💭 Injecting memory context: {memory_context[:100]}...")
+            logger.info("💭 Injecting memory context: %.100s...", memory_context)
             # Add memory context as an assistant message (not persisted beyond this turn)
             turn_ctx.add_message(
                 role="assistant",
@@ -170,7 +253,7 @@ PERSONALITY:
         Returns:
             Search results with titles and snippets from web pages
         """
-        logger.info(f"🔍 Web search requested: {query}")
+        logger.info("🔍 Web search requested: %s", query)
         return await web_search(query)
 
     # ========== MEMORY TOOLS (for explicit queries only) ==========
@@ -212,6 +295,10 @@ async def entrypoint(ctx: JobContext):
     """Main agent entry point."""
     logger.info("🚀 Starting Melissa agent session...")
     
+    # Warm up Mem0 (import + vector store open) in the background so it
+    # doesn't land on the user's first turn; the greeting doesn't need it
+    memory_warmup = asyncio.create_task(mem0_ensure_ready())
+    
     # Connect to the room first
     await ctx.connect()
     logger.info(f"📡 Connected to room: {ctx.room.name}")
@@ -224,8 +311,22 @@ async def entrypoint(ctx: JobContext):
         discard_audio_if_uninterruptible=True,
     )
     
-    # Track conversation for Mem0 automatic learning
+    assistant = MelissaAssistant()
+    
+    # Track conversation for Mem0 automatic learning.
+    # Exchanges are queued and learned from in batches by a background worker.
     last_user_input = ""
+    learn_queue: asyncio.Queue = asyncio.Queue()
+    learn_worker = asyncio.create_task(mem0_learning_worker(learn_queue))
+    
+    async def on_shutdown():
+        """Flush pending learning and release Mem0 threads."""
+        learn_queue.put_nowait(None)
+        await learn_worker
+        await memory_warmup
+        await mem0_aclose()
+    
+    ctx.add_shutdown_callback(on_shutdown)
     
     @session.on("user_input_transcribed")
     def on_user_input(event):
@@ -233,7 +334,9 @@ async def entrypoint(ctx: JobContext):
         nonlocal last_user_input
         if event.is_final:
             last_user_input = event.transcript
-            logger.info(f"📝 User said: {last_user_input}")
+            logger.info("📝 User said: %s", last_user_input)
+        # Kick off the memory lookup while the user is still speaking
+        assistant.prefetch_memory_context(event.transcript, is_final=event.is_final)
     
     @session.on("conversation_item_added") 
     def on_conversation_item(event):
@@ -242,31 +345,34 @@ async def entrypoint(ctx: JobContext):
         Mem0 AUTOMATICALLY learns from every conversation exchange.
         """
         nonlocal last_user_input
-        text_preview = event.item.text_content[:100] if event.item.text_content else 'None'
-        logger.info(f"💬 Conversation item: role={event.item.role}, text={text_preview}...")
+        item_text = event.item.text_content or ""
+        logger.info("💬 Conversation item: role=%s, len=%d", event.item.role, len(item_text))
         
         # When assistant responds, learn from the full exchange
         if event.item.role == "assistant" and last_user_input:
-            agent_text = event.item.text_content or ""
+            agent_text = item_text
             if agent_text:
                 # Mem0 AUTOMATICALLY extracts facts from conversation
                 # No tool call needed - this happens in background!
-                logger.info(f"🧠 AUTO-LEARNING from: User='{last_user_input[:50]}...' Agent='{agent_text[:50]}...'")
-                asyncio.create_task(
-                    mem0_learn_from_conversation(last_user_input, agent_text[:500])
+                logger.info(
+                    "🧠 AUTO-LEARNING from exchange: user_len=%d, agent_len=%d",
+                    len(last_user_input), len(agent_text),
                 )
+                learn_queue.put_nowait((last_user_input, agent_text[:500]))
                 last_user_input = ""
     
     @session.on("function_tools_executed")
     def on_tools_executed(event):
         """Called when function tools are executed."""
         for call, output in event.zipped():
-            result_preview = output.result[:200] if output.result else 'None'
-            logger.info(f"🔧 TOOL EXECUTED: {call.name}({call.arguments}) -> {result_preview}")
+            logger.info(
+                "🔧 TOOL EXECUTED: %s(%s) -> %.200s",
+                call.name, call.arguments, output.result or 'None',
+            )
     
     # Start the agent session with our assistant
     await session.start(
-        agent=MelissaAssistant(),
+        agent=assistant,
         room=ctx.room,
     )
     
@@ -11,15 +11,106 @@ Mem0 Docs: https://docs.mem0.ai/
 """
 
 import asyncio
+import functools
 import logging
-from typing import List, Dict
-from datetime import datetime
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Optional
+
+# Errors from outages, rate limits and timeouts: expected, logged as warnings
+_TRANSIENT_ERRORS: tuple = (TimeoutError, asyncio.TimeoutError, ConnectionError)
+try:
+    import openai
+    _TRANSIENT_ERRORS += (
+        openai.RateLimitError,
+        openai.APITimeoutError,
+        openai.APIConnectionError,
+    )
+except ImportError:
+    pass
+try:
+    from mem0.exceptions import VectorStoreError
+    _TRANSIENT_ERRORS += (VectorStoreError,)
+except ImportError:
+    pass
 
 logger = logging.getLogger(__name__)
 
 # User ID for Mem0 (single user assistant)
 DEFAULT_USER_ID = "melissa_user"
 
+# Batched learning: flush after this many exchanges or this many idle seconds
+LEARN_BATCH_SIZE = 4
+LEARN_IDLE_SECONDS = 5.0
+
+# User messages shorter than this (in words) are skipped unless they name something
+LEARN_MIN_WORDS = 4
+_PRONOUN_I = {"i", "i'm", "i've", "i'll", "i'd"}
+
+# text-embedding-3-small is trained to be truncated (Matryoshka); 512 dims
+# keeps recall for short personal facts at a third of the index size
+EMBEDDING_DIMS = 512
+
+# Local vector store location (versioned: changing EMBEDDING_DIMS needs a fresh index)
+MEM0_DB_PATH = "./melissa_mem0_db_v2"
+
+# Recent context lookups are reused for repeated questions within a session
+CONTEXT_CACHE_SIZE = 64
+CONTEXT_CACHE_TTL = 60.0
+
+# Wrapping for memories injected into the LLM context
+_CONTEXT_HEADER = "\n[RELEVANT MEMORIES ABOUT USER]\n- "
+_CONTEXT_FOOTER = "\n[END MEMORIES]\n"
+
+# Log formats for failed Mem0 calls: (operation, error)
+_TRANSIENT_LOG_FORMAT = "Mem0 %s failed (transient): %r"
+_ERROR_LOG_FORMAT = "Mem0 %s error: %s"
+
+# Worker threads dedicated to blocking Mem0 calls
+MEM0_MAX_WORKERS = 4
+
+# After a failed initialization, memory stays disabled this long before retrying
+MEM0_INIT_RETRY_SECONDS = 30.0
+
+# How many text -> embedding vectors to keep in-process
+EMBEDDING_CACHE_SIZE = 512
+
+
+# (epoch second, formatted timestamp) of the last _now_iso() call
+_last_timestamp = (0, "")
+
+
+def _now_iso() -> str:
+    """Local ISO-8601 timestamp at second resolution, formatted once per second."""
+    global _last_timestamp
+    now = int(time.time())
+    if _last_timestamp[0] != now:
+        _last_timestamp = (now, time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(now)))
+    return _last_timestamp[1]
+
+
+def _log_failure(operation: str, e: Exception) -> None:
+    """Log a failed Mem0 call; only unexpected errors carry a traceback."""
+    if isinstance(e, _TRANSIENT_ERRORS):
+        logger.warning(_TRANSIENT_LOG_FORMAT, operation, e)
+    else:
+        logger.error(_ERROR_LOG_FORMAT, operation, e, exc_info=e)
+
+
+def _close_client(client) -> None:
+    """Close the vector store client behind a Mem0 Memory (releases its file lock)."""
+    store_client = getattr(getattr(client, "vector_store", None), "client", None)
+    if store_client is not None and hasattr(store_client, "close"):
+        store_client.close()
+
+
+def _normalize_text(text: str) -> str:
+    """Lowercase and collapse whitespace so near-identical texts share a key."""
+    return " ".join(text.lower().split())
+
 
 class Mem0Memory:
     """
@@ -36,17 +127,34 @@ class Mem0Memory:
         self.user_id = user_id
         self._client = None
         self._initialized = False
+        self._init_lock = asyncio.Lock()
+        self._retry_at = 0.0
+        self._closed = False
+        self._executor: Optional[ThreadPoolExecutor] = None
+        # (normalized query, limit) -> (expires_at, context)
+        self._context_cache: "OrderedDict[tuple, tuple]" = OrderedDict()
         
     def _ensure_initialized(self):
-        """Lazy initialization of Mem0 client (local mode with ChromaDB)."""
+        """
+        Lazy initialization of Mem0 client (local mode with embedded Qdrant).
+        
+        Embedded Qdrant locks MEM0_DB_PATH, so only one process can hold the
+        memory store at a time; a second one (e.g. a new job starting while
+        the previous one is still flushing) runs without memory and retries
+        after MEM0_INIT_RETRY_SECONDS.
+        """
+        if self._closed:
+            return False
         if self._initialized:
             return True
+        if time.monotonic() < self._retry_at:
+            return False
             
         try:
             from mem0 import Memory
             
             # Local Mem0 configuration:
-            # - ChromaDB for vector storage (local, no external service needed)
+            # - Embedded Qdrant for vector storage (in-process, no external service needed)
             # - OpenAI for LLM and embeddings (uses your OPENAI_API_KEY)
             config = {
                 "llm": {
@@ -59,30 +167,136 @@ class Mem0Memory:
                 "embedder": {
                     "provider": "openai",
                     "config": {
-                        "model": "text-embedding-3-small"
+                        "model": "text-embedding-3-small",
+                        "embedding_dims": EMBEDDING_DIMS,
                     }
                 },
                 "vector_store": {
-                    "provider": "chroma",
+                    "provider": "qdrant",
                     "config": {
                         "collection_name": "melissa_memories",
-                        "path": "./melissa_mem0_db",
+                        "path": MEM0_DB_PATH,
+                        "embedding_model_dims": EMBEDDING_DIMS,
+                        # Persist to path (on_disk=False makes Mem0 wipe it)
+                        "on_disk": True,
                     }
                 },
                 "version": "v1.1"
             }
             self._client = Memory.from_config(config)
-            logger.info("✅ Mem0 initialized (local ChromaDB + OpenAI embeddings)")
+            self._install_embedding_cache()
+            logger.info("✅ Mem0 initialized (local Qdrant + OpenAI embeddings)")
             
             self._initialized = True
             return True
             
         except ImportError as e:
             logger.error(f"❌ Mem0 not installed. Run: pip install mem0ai. Error: {e}")
-            return False
+        except RuntimeError as e:
+            if "already accessed" not in str(e):
+                logger.error(f"❌ Mem0 initialization failed: {e}", exc_info=True)
+            else:
+                logger.warning(
+                    f"⚠️ Memory store {MEM0_DB_PATH} is in use by another process "
+                    f"(embedded Qdrant allows one at a time). Continuing without memory, "
+                    f"retrying in {MEM0_INIT_RETRY_SECONDS:.0f}s."
+                )
         except Exception as e:
             logger.error(f"❌ Mem0 initialization failed: {e}", exc_info=True)
+        
+        self._retry_at = time.monotonic() + MEM0_INIT_RETRY_SECONDS
+        return False
+    
+    def _install_embedding_cache(self):
+        """
+        Memoize the embedder so the same text is only embedded once.
+        
+        A turn searches with the user's text and later adds the same
+        exchange, and Mem0 re-embeds extracted facts while deduplicating
+        them - without this each of those is a separate OpenAI round-trip.
+        
+        Vectors are held as packed float32 arrays rather than lists of
+        Python floats (4 vs ~32 bytes per dimension).
+        """
+        embedder = self._client.embedding_model
+        embed = embedder.embed
+        # normalized text -> vector; shared by the mem0 worker threads
+        cache: "OrderedDict[str, array]" = OrderedDict()
+        lock = threading.Lock()
+        
+        def embed_with_cache(text, *args, **kwargs):
+            # memory_action ("add"/"search"/...) doesn't change OpenAI vectors
+            key = _normalize_text(text)
+            with lock:
+                vector = cache.get(key)
+                if vector is not None:
+                    cache.move_to_end(key)
+                    return vector.tolist()
+            # Embed the original text; normalization only decides what's a hit
+            vector = array("f", embed(text))
+            with lock:
+                cache[key] = vector
+                if len(cache) > EMBEDDING_CACHE_SIZE:
+                    cache.popitem(last=False)
+            return vector.tolist()
+        
+        embedder.embed = embed_with_cache
+    
+    async def ensure_ready(self) -> bool:
+        """
+        Initialize Mem0 off the event loop, once.
+        
+        Called at agent startup so the import, vector store open and client
+        setup don't land on the user's first turn.
+        """
+        if self._closed:
             return False
+        if self._initialized:
+            return True
+        if time.monotonic() < self._retry_at:
+            return False
+        async with self._init_lock:
+            return await self._run_sync(self._ensure_initialized)
+    
+    async def _run_sync(self, fn, *args):
+        """
+        Run a blocking Mem0 call on the dedicated mem0 thread pool.
+        
+        Keeps bursts of search/learn calls bounded and off the default
+        executor that LiveKit and other to_thread users share.
+        """
+        if self._closed:
+            raise RuntimeError("Mem0 memory is closed")
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=MEM0_MAX_WORKERS, thread_name_prefix="mem0"
+            )
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(fn, *args))
+    
+    async def aclose(self) -> None:
+        """
+        Close the Mem0 client and shut down the mem0 thread pool.
+        
+        Closing releases the embedded Qdrant lock on MEM0_DB_PATH for the
+        next process. Calls still running in the pool (e.g. a cancelled
+        speculative search) finish first; later calls see memory as
+        unavailable.
+        """
+        self._closed = True
+        loop = asyncio.get_running_loop()
+        
+        executor, self._executor = self._executor, None
+        if executor:
+            await loop.run_in_executor(None, executor.shutdown)
+        
+        client, self._client = self._client, None
+        self._initialized = False
+        if client:
+            try:
+                await loop.run_in_executor(None, _close_client, client)
+            except Exception as e:
+                logger.warning(f"Mem0 close error: {e}")
     
     def _sync_add(self, content, user_id: str, metadata: Dict) -> Dict:
         """Synchronous wrapper for Mem0 add operation."""
@@ -90,11 +304,11 @@ class Mem0Memory:
     
     def _sync_search(self, query: str, user_id: str, limit: int) -> Dict:
         """Synchronous wrapper for Mem0 search operation."""
-        return self._client.search(query, user_id=user_id, limit=limit)
+        return self._client.search(query, filters={"user_id": user_id}, top_k=limit)
     
     def _sync_get_all(self, user_id: str) -> Dict:
         """Synchronous wrapper for Mem0 get_all operation."""
-        return self._client.get_all(user_id=user_id)
+        return self._client.get_all(filters={"user_id": user_id})
     
     def _sync_delete_all(self, user_id: str) -> None:
         """Synchronous wrapper for Mem0 delete_all operation."""
@@ -102,11 +316,11 @@ class Mem0Memory:
     
     async def get_all_memories(self) -> str:
         """Get all stored memories."""
-        if not self._ensure_initialized():
+        if not await self.ensure_ready():
             return "Memory system not available."
         
         try:
-            results = await asyncio.to_thread(self._sync_get_all, self.user_id)
+            results = await self._run_sync(self._sync_get_all, self.user_id)
             
             if not results or not results.get("results"):
                 return "I don't have any memories stored yet. Tell me things about yourself!"
@@ -122,19 +336,20 @@ class Mem0Memory:
             return "I don't have any memories stored yet."
             
         except Exception as e:
-            logger.error(f"Mem0 get_all error: {e}")
+            _log_failure("get_all", e)
             return f"Couldn't retrieve memories: {str(e)}"
     
     async def delete_all_memories(self) -> str:
         """Delete all memories for the user."""
-        if not self._ensure_initialized():
+        if not await self.ensure_ready():
             return "Memory system not available."
         
         try:
-            await asyncio.to_thread(self._sync_delete_all, self.user_id)
+            await self._run_sync(self._sync_delete_all, self.user_id)
+            self._context_cache.clear()
             return "All memories have been deleted. Starting fresh!"
         except Exception as e:
-            logger.error(f"Mem0 delete_all error: {e}")
+            _log_failure("delete_all", e)
             return f"Couldn't delete memories: {str(e)}"
     
     async def add_conversation(self, messages: List[Dict[str, str]]) -> str:
@@ -147,63 +362,70 @@ class Mem0Memory:
         Returns:
             What was learned from the conversation
         """
-        if not self._ensure_initialized():
+        if not await self.ensure_ready():
             return "Memory system not available."
         
         try:
-            result = await asyncio.to_thread(
+            result = await self._run_sync(
                 self._sync_add,
                 messages,
                 self.user_id,
-                {"type": "conversation", "timestamp": datetime.now().isoformat()}
+                {"type": "conversation", "timestamp": _now_iso()}
             )
             
             if result and "results" in result:
                 facts = [r.get("memory", "") for r in result.get("results", [])]
                 if facts:
+                    # New facts may change what's relevant to cached queries
+                    self._context_cache.clear()
                     logger.info(f"🧠 Learned from conversation: {facts}")
                     return f"Learned: {', '.join(facts)}"
             
             return "Conversation processed."
             
         except Exception as e:
-            logger.error(f"Mem0 add_conversation error: {e}")
+            _log_failure("add_conversation", e)
             return f"Couldn't process conversation: {str(e)}"
     
     async def get_relevant_context(self, query: str, limit: int = 3) -> str:
         """
         Get relevant memories to inject into LLM context.
         This is called before each response to provide context.
+        Repeated queries within CONTEXT_CACHE_TTL seconds are served from cache.
         
         Returns formatted context string for the LLM.
         """
-        if not self._ensure_initialized():
+        if not await self.ensure_ready():
             return ""
         
+        key = (_normalize_text(query), limit)
+        cached = self._context_cache.get(key)
+        if cached and cached[0] > time.monotonic():
+            self._context_cache.move_to_end(key)
+            return cached[1]
+        
         try:
-            results = await asyncio.to_thread(
+            results = await self._run_sync(
                 self._sync_search,
                 query,
                 self.user_id,
                 limit
             )
-            
-            if not results or not results.get("results"):
-                return ""
-            
-            memories = []
-            for r in results.get("results", []):
-                memory_text = r.get("memory", "")
-                if memory_text and r.get("score", 0) > 0.5:  # Only high relevance
-                    memories.append(memory_text)
-            
-            if memories:
-                return "\n[RELEVANT MEMORIES ABOUT USER]\n" + "\n".join(f"- {m}" for m in memories) + "\n[END MEMORIES]\n"
-            return ""
-            
         except Exception as e:
-            logger.error(f"Mem0 context error: {e}")
+            _log_failure("context search", e)
             return ""
+        
+        memories = [
+            r["memory"] for r in (results or {}).get("results", [])[:limit]
+            if r.get("memory") and r.get("score", 0) > 0.5  # Only high relevance
+        ]
+        context = _CONTEXT_HEADER + "\n- ".join(memories) + _CONTEXT_FOOTER if memories else ""
+        
+        self._context_cache[key] = (time.monotonic() + CONTEXT_CACHE_TTL, context)
+        self._context_cache.move_to_end(key)
+        if len(self._context_cache) > CONTEXT_CACHE_SIZE:
+            self._context_cache.popitem(last=False)
+        return context
 
 
 # Global instance
@@ -214,6 +436,16 @@ mem0_memory = Mem0Memory()
 # TOOL FUNCTIONS FOR AGENT
 # ============================================================
 
+async def mem0_ensure_ready() -> bool:
+    """Warm up the Mem0 client ahead of the first conversation turn."""
+    return await mem0_memory.ensure_ready()
+
+
+async def mem0_aclose() -> None:
+    """Release Mem0 worker threads (call on session shutdown)."""
+    await mem0_memory.aclose()
+
+
 async def mem0_get_all() -> str:
     """Get all stored memories."""
     logger.info("📚 Mem0 get all memories")
@@ -231,13 +463,79 @@ async def mem0_learn_from_conversation(user_message: str, assistant_response: st
     Learn from a conversation exchange.
     Called automatically after each interaction.
     """
-    messages = [
+    if not _worth_learning(user_message):
+        return "skipped"
+    return await mem0_memory.add_conversation(
+        _exchange_messages(user_message, assistant_response)
+    )
+
+
+def _exchange_messages(user_message: str, assistant_response: str) -> List[Dict[str, str]]:
+    """Build Mem0 chat messages for one user/assistant exchange."""
+    return [
         {"role": "user", "content": user_message},
         {"role": "assistant", "content": assistant_response}
     ]
+
+
+def _worth_learning(user_message: str) -> bool:
+    """
+    Cheap filter for exchanges that can't carry facts ("ok", "thanks", "yes").
+    
+    Short messages are only kept if they contain a capitalized word
+    after the first one (likely a name or place, e.g. "I'm Greg").
+    """
+    words = user_message.split()
+    if len(words) >= LEARN_MIN_WORDS:
+        return True
+    return any(w[0].isupper() and w.lower() not in _PRONOUN_I for w in words[1:])
+
+
+async def _learn_from_batch(batch: List[tuple]) -> str:
+    """Learn from several exchanges with a single Mem0 add (one extraction call)."""
+    batch = [exchange for exchange in batch if _worth_learning(exchange[0])]
+    if not batch:
+        return "skipped"
+    
+    messages = []
+    for user_message, assistant_response in batch:
+        messages.extend(_exchange_messages(user_message, assistant_response))
+    logger.info(f"🧠 Learning from {len(batch)} exchange(s)")
     return await mem0_memory.add_conversation(messages)
 
 
+async def mem0_learning_worker(queue: asyncio.Queue) -> None:
+    """
+    Background consumer that learns from queued (user, assistant) exchanges.
+    
+    Exchanges are coalesced into one Mem0 add per LEARN_BATCH_SIZE turns, or
+    after LEARN_IDLE_SECONDS of silence, so fact extraction runs once per
+    batch instead of after every reply. Put None on the queue to flush
+    pending exchanges and stop (cancellation can be swallowed by
+    asyncio.wait_for on Python < 3.12).
+    """
+    batch: List[tuple] = []
+    stopping = False
+    while not stopping:
+        exchange = await queue.get()
+        if exchange is None:
+            stopping = True
+        else:
+            batch.append(exchange)
+            try:
+                while len(batch) < LEARN_BATCH_SIZE:
+                    exchange = await asyncio.wait_for(queue.get(), timeout=LEARN_IDLE_SECONDS)
+                    if exchange is None:
+                        stopping = True
+                        break
+                    batch.append(exchange)
+            except asyncio.TimeoutError:
+                pass
+        if batch:
+            pending, batch = batch, []
+            await _learn_from_batch(pending)
+
+
 async def mem0_get_context(query: str) -> str:
     """
     Get relevant context for the current query.
@@ -9,8 +9,18 @@ Note: AI Memory is now handled by memory_system.py (Mem0)
 """
 
 import os
+import asyncio
 import logging
-from typing import Annotated
+import time
+from collections import OrderedDict, namedtuple
+from typing import Annotated, Optional
+
+try:
+    from duckduckgo_search import DDGS
+    _HAS_DDG = True
+except ImportError:
+    DDGS = None
+    _HAS_DDG = False
 
 logger = logging.getLogger(__name__)
 
@@ -18,29 +28,54 @@ logger = logging.getLogger(__name__)
 # BOOK DATABASE
 # ============================================================
 
-READ_BOOKS = {
-    "book1": {
-        "title": "Book 1",
-        "author": "Author 1",
-        "status": "read",
-        "rating": None,
-        "notes": ""
-    },
-    "book2": {
-        "title": "Book 2", 
-        "author": "Author 2",
-        "status": "read",
-        "rating": None,
-        "notes": ""
-    },
-    "book3": {
-        "title": "Book 3",
-        "author": "Author 3", 
-        "status": "read",
-        "rating": None,
-        "notes": ""
-    }
-}
+# Read-mostly table: replace READ_BOOKS (and call _invalidate_books_cache)
+# to change it
+Book = namedtuple("Book", ["id", "title", "author", "status", "rating", "notes"])
+
+READ_BOOKS = (
+    Book("book1", "Book 1", "Author 1", "read", None, ""),
+    Book("book2", "Book 2", "Author 2", "read", None, ""),
+    Book("book3", "Book 3", "Author 3", "read", None, ""),
+)
+
+
+def _rebuild_book_index() -> None:
+    """Rebuild the lookup tables derived from READ_BOOKS."""
+    global _BOOK_INDEX, _AVAILABLE_TITLES
+    index = {}
+    for book in READ_BOOKS:
+        for key in (book.id.lower(), book.title.lower()):
+            existing = index.setdefault(key, book)
+            if existing is not book:
+                logger.warning("Book lookup key '%s' is ambiguous, keeping '%s'", key, existing.title)
+    _BOOK_INDEX = index
+    _AVAILABLE_TITLES = ", ".join(b.title for b in READ_BOOKS)
+
+
+# Lowercased book id / title -> Book, and the titles listed on a miss
+_BOOK_INDEX: dict = {}
+_AVAILABLE_TITLES = ""
+_rebuild_book_index()
+
+# get_book_details() output template
+_BOOK_DETAILS_TMPL = (
+    "Book Details:\n"
+    "- Title: {title}\n"
+    "- Author: {author}\n"
+    "- Status: {status}\n"
+    "- Rating: {rating}\n"
+    "- Notes: {notes}"
+)
+
+# Formatted check_read_books() output, built on first use
+_READ_BOOKS_CACHE: Optional[str] = None
+
+
+def _invalidate_books_cache() -> None:
+    """Call after replacing READ_BOOKS (e.g. from an add/update book tool)."""
+    global _READ_BOOKS_CACHE
+    _READ_BOOKS_CACHE = None
+    _rebuild_book_index()
 
 
 # ============================================================
@@ -51,22 +86,24 @@ async def check_read_books() -> str:
     """
     Check and list all books that the user has read.
     """
+    global _READ_BOOKS_CACHE
     logger.info("Tool called: check_read_books")
     
+    if _READ_BOOKS_CACHE is not None:
+        return _READ_BOOKS_CACHE
+    
     if not READ_BOOKS:
         return "You haven't recorded any books yet."
     
-    books_list = []
-    for book_id, book_info in READ_BOOKS.items():
-        book_str = f"- {book_info['title']} by {book_info['author']}"
-        if book_info.get('rating'):
-            book_str += f" (Rating: {book_info['rating']}/5)"
-        if book_info.get('notes'):
-            book_str += f" - Notes: {book_info['notes']}"
-        books_list.append(book_str)
-    
-    result = f"You have read {len(READ_BOOKS)} books:\n" + "\n".join(books_list)
-    return result
+    _READ_BOOKS_CACHE = f"You have read {len(READ_BOOKS)} books:\n" + "\n".join(
+        "".join((
+            f"- {b.title} by {b.author}",
+            f" (Rating: {b.rating}/5)" if b.rating else "",
+            f" - Notes: {b.notes}" if b.notes else "",
+        ))
+        for b in READ_BOOKS
+    )
+    return _READ_BOOKS_CACHE
 
 
 async def get_book_details(
@@ -75,60 +112,96 @@ async def get_book_details(
     """
     Get detailed information about a specific book.
     """
-    logger.info(f"Tool called: get_book_details for '{book_name}'")
+    logger.info("Tool called: get_book_details for '%s'", book_name)
     
-    book_name_lower = book_name.lower().strip()
+    book = _BOOK_INDEX.get(book_name.lower().strip())
+    if book:
+        return _BOOK_DETAILS_TMPL.format_map({
+            "title": book.title,
+            "author": book.author,
+            "status": book.status,
+            "rating": book.rating or "Not rated",
+            "notes": book.notes or "No notes",
+        })
     
-    for book_id, book_info in READ_BOOKS.items():
-        if book_id.lower() == book_name_lower or book_info['title'].lower() == book_name_lower:
-            details = f"""
-Book Details:
-- Title: {book_info['title']}
-- Author: {book_info['author']}
-- Status: {book_info['status']}
-- Rating: {book_info.get('rating', 'Not rated')}
-- Notes: {book_info.get('notes', 'No notes')}
-"""
-            return details.strip()
-    
-    return f"I couldn't find a book called '{book_name}'. Available books are: {', '.join(b['title'] for b in READ_BOOKS.values())}"
+    return f"I couldn't find a book called '{book_name}'. Available books are: {_AVAILABLE_TITLES}"
 
 
 # ============================================================
 # WEB SEARCH (DuckDuckGo - no API key needed)
 # ============================================================
 
+# Recent search results, keyed by (normalized query, max_results)
+SEARCH_CACHE_SIZE = 256
+SEARCH_CACHE_TTL = 300.0
+SEARCH_TIMEOUT = 10  # seconds, per DuckDuckGo request
+_SEARCH_CACHE: "OrderedDict[tuple, tuple]" = OrderedDict()  # key -> (expires_at, result)
+_SEARCH_IN_FLIGHT: dict = {}  # key -> Task, so concurrent duplicates share one request
+
+
 async def web_search(query: str, max_results: int = 5) -> str:
     """
     Search the web using DuckDuckGo.
+    
+    Identical searches within SEARCH_CACHE_TTL seconds are answered from cache.
     """
-    logger.info(f"Tool called: web_search for '{query}'")
+    logger.info("Tool called: web_search for '%s'", query)
+    
+    if not _HAS_DDG:
+        logger.warning("duckduckgo-search not installed")
+        return "Web search unavailable. Please install duckduckgo-search."
     
+    key = (query.strip().lower(), max_results)
+    cached = _SEARCH_CACHE.get(key)
+    if cached and cached[0] > time.monotonic():
+        _SEARCH_CACHE.move_to_end(key)
+        return cached[1]
+    
+    task = _SEARCH_IN_FLIGHT.get(key)
+    if task is None:
+        task = asyncio.ensure_future(_search_uncached(key, query, max_results))
+        _SEARCH_IN_FLIGHT[key] = task
+        task.add_done_callback(lambda _: _SEARCH_IN_FLIGHT.pop(key, None))
+    return await asyncio.shield(task)
+
+
+def _cache_search(key: tuple, result: str) -> str:
+    """Store a successful search result and evict the oldest entries."""
+    _SEARCH_CACHE[key] = (time.monotonic() + SEARCH_CACHE_TTL, result)
+    _SEARCH_CACHE.move_to_end(key)
+    if len(_SEARCH_CACHE) > SEARCH_CACHE_SIZE:
+        _SEARCH_CACHE.popitem(last=False)
+    return result
+
+
+def _search_sync(query: str, max_results: int) -> list:
+    """Blocking DuckDuckGo search (run in a worker thread)."""
+    results = []
+    with DDGS(timeout=SEARCH_TIMEOUT) as ddgs:
+        for r in ddgs.text(query, max_results=max_results):
+            results.append({
+                "title": r.get("title", ""),
+                "body": r.get("body", ""),
+                "href": r.get("href", "")
+            })
+    return results
+
+
+async def _search_uncached(key: tuple, query: str, max_results: int) -> str:
+    """Run a DuckDuckGo search off the event loop and format the results."""
     try:
-        from duckduckgo_search import DDGS
-        
-        results = []
-        with DDGS() as ddgs:
-            for r in ddgs.text(query, max_results=max_results):
-                results.append({
-                    "title": r.get("title", ""),
-                    "body": r.get("body", ""),
-                    "href": r.get("href", "")
-                })
+        results = await asyncio.to_thread(_search_sync, query, max_results)
         
         if not results:
-            return f"I couldn't find any results for '{query}'."
-        
-        formatted = f"Search results for '{query}':\n\n"
-        for i, r in enumerate(results, 1):
-            formatted += f"{i}. {r['title']}\n"
-            formatted += f"   {r['body'][:200]}...\n\n"
+            return _cache_search(key, f"I couldn't find any results for '{query}'.")
         
-        return formatted
+        parts = [f"Search results for '{query}':\n\n"]
+        parts.extend(
+            f"{i}. {r['title']}\n   {r['body'][:200]}...\n\n"
+            for i, r in enumerate(results, 1)
+        )
+        return _cache_search(key, "".join(parts))
         
-    except ImportError:
-        logger.warning("duckduckgo-search not installed")
-        return "Web search unavailable. Please install duckduckgo-search."
     except Exception as e:
-        logger.error(f"Web search error: {e}")
+        logger.error("Web search error: %s", e)
         return f"Sorry, I couldn't search the web right now. Error: {str(e)}"
@@ -6,21 +6,107 @@ when the wake word "Melissa" is detected.
 """
 
 import asyncio
-import struct
 import os
+import time
+from collections import deque
 from typing import Callable, Optional
 import logging
 
+import numpy as np
+
 try:
     import pvporcupine
+except ImportError:
+    raise ImportError(
+        "Please install picovoice dependencies: pip install pvporcupine"
+    )
+
+# Audio input: sounddevice is preferred, PyAudio is the fallback
+try:
+    import sounddevice as sd
+except ImportError:
+    sd = None
+try:
     import pyaudio
 except ImportError:
+    pyaudio = None
+if sd is None and pyaudio is None:
     raise ImportError(
-        "Please install picovoice dependencies: pip install pvporcupine pyaudio"
+        "Please install an audio input backend: pip install sounddevice (or pyaudio)"
     )
 
 logger = logging.getLogger(__name__)
 
+# PortAudio buffer size in Porcupine frames; slack so a late wakeup (GC,
+# LLM/TTS CPU spikes) doesn't overflow the input
+FRAMES_PER_BUFFER = 2
+
+# Frames collected before the detector is woken: one event-loop dispatch per
+# batch instead of per frame (~128 ms worst-case added detection latency)
+DISPATCH_BATCH_FRAMES = 4
+
+# Captured buffers held between PortAudio callbacks and the detector (~1 s).
+# Preallocated ring, so steady-state capture doesn't allocate per buffer.
+MAX_PENDING_BUFFERS = 16
+
+# Energy gate in front of Porcupine: frames quieter than the noise floor
+# (times the threshold) are skipped. The last few skipped frames are replayed
+# when the gate opens (pre-roll, for soft keyword onsets) and frames keep
+# flowing for a while after speech (hangover, for soft tails).
+VAD_PREROLL_FRAMES = 10       # ~0.3 s at 512 samples / 16 kHz
+VAD_HANGOVER_FRAMES = 16      # ~0.5 s
+NOISE_FLOOR_RISE = 0.01       # floor follows louder ambience slowly, drops instantly
+MIN_NOISE_FLOOR = 2500.0      # mean-square energy (~50 RMS), keeps digital silence from gating open
+
+# Two-stage detection: audio kept for the verifier to re-check a candidate (~1.5 s)
+VERIFY_HISTORY_FRAMES = 48
+
+# Loaded Porcupine engines keyed by (access_key, keyword_path, sensitivity).
+# Model loading is slow, so engines outlive a single start()/stop() cycle.
+_PORCUPINE_ENGINES: dict = {}
+
+
+def _get_porcupine(
+    access_key: str,
+    keyword_path: Optional[str],
+    sensitivity: float
+) -> "pvporcupine.Porcupine":
+    """
+    Return a cached Porcupine engine, creating it on first use.
+    
+    Engines keep per-stream state, so one engine must not be used by two
+    detectors listening at the same time.
+    """
+    key = (access_key, keyword_path, sensitivity)
+    engine = _PORCUPINE_ENGINES.get(key)
+    if engine is not None:
+        return engine
+    
+    if keyword_path:
+        # Use custom wake word file
+        engine = pvporcupine.create(
+            access_key=access_key,
+            keyword_paths=[keyword_path],
+            sensitivities=[sensitivity]
+        )
+        logger.info("Loaded custom wake word from: %s", keyword_path)
+    else:
+        # Use built-in keyword as fallback
+        # Available built-in keywords: alexa, americano, blueberry, bumblebee, 
+        # computer, grapefruit, grasshopper, hey google, hey siri, jarvis, ok google, 
+        # picovoice, porcupine, terminator
+        engine = pvporcupine.create(
+            access_key=access_key,
+            keywords=["jarvis"],  # Using "jarvis" as fallback - replace with custom Melissa
+            sensitivities=[sensitivity]
+        )
+        logger.warning(
+            "No custom 'Melissa' wake word file found. Using 'jarvis' as fallback. "
+            "Create a custom wake word at https://console.picovoice.ai/ppn"
+        )
+    _PORCUPINE_ENGINES[key] = engine
+    return engine
+
 
 class WakeWordDetector:
     """
@@ -35,7 +121,10 @@ class WakeWordDetector:
         self,
         access_key: Optional[str] = None,
         keyword_path: Optional[str] = None,
-        sensitivity: float = 0.5
+        sensitivity: float = 0.5,
+        vad_threshold_db: Optional[float] = 10.0,
+        verify_sensitivity: Optional[float] = None,
+        verify_keyword_path: Optional[str] = None
     ):
         """
         Initialize the wake word detector.
@@ -45,6 +134,14 @@ class WakeWordDetector:
             keyword_path: Path to custom .ppn wake word file. If None, uses built-in "jarvis" 
                          (you'll need to create a custom "Melissa" wake word at console.picovoice.ai)
             sensitivity: Detection sensitivity (0.0 to 1.0). Higher = more sensitive but more false positives.
+            vad_threshold_db: How far (in dB) a frame must rise above the ambient noise floor
+                         to be passed to Porcupine. None disables the energy gate.
+            verify_sensitivity: Enables two-stage detection. The main engine then acts as a
+                         recall-first candidate detector (raise `sensitivity`), and each
+                         candidate is re-checked over the last ~1.5 s of audio by a second,
+                         stricter engine at this sensitivity. None = single stage.
+            verify_keyword_path: Optional different .ppn model for the verification stage.
+                         Defaults to the main wake word.
         """
         self.access_key = access_key or os.environ.get("PICOVOICE_ACCESS_KEY")
         if not self.access_key:
@@ -55,87 +152,217 @@ class WakeWordDetector:
         
         self.keyword_path = keyword_path
         self.sensitivity = sensitivity
+        self.verify_sensitivity = verify_sensitivity
+        self.verify_keyword_path = verify_keyword_path
         self._porcupine: Optional[pvporcupine.Porcupine] = None
+        self._verifier: Optional[pvporcupine.Porcupine] = None
         self._audio_stream = None
-        self._pa: Optional[pyaudio.PyAudio] = None
+        self._pa = None
         self._running = False
+        # Ring of captured buffers: PortAudio's callback thread writes slot
+        # _write_seq % MAX_PENDING_BUFFERS, start() reads up to _write_seq
+        self._ring: Optional[np.ndarray] = None
+        self._write_seq = 0
+        self._read_seq = 0
+        self._overflows = 0
+        self._frame_ready: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        # Energy gate state
+        # Compared against energy (power), hence dB / 10
+        self._vad_ratio = None if vad_threshold_db is None else 10 ** (vad_threshold_db / 10)
+        self._noise_floor = MIN_NOISE_FLOOR
+        self._hangover = 0
         
     def _initialize_porcupine(self):
-        """Initialize the Porcupine wake word engine."""
-        if self.keyword_path and os.path.exists(self.keyword_path):
-            # Use custom wake word file
-            self._porcupine = pvporcupine.create(
-                access_key=self.access_key,
-                keyword_paths=[self.keyword_path],
-                sensitivities=[self.sensitivity]
+        """Initialize the Porcupine wake word engine (reused across start() calls)."""
+        custom = bool(self.keyword_path and os.path.exists(self.keyword_path))
+        keyword_path = self.keyword_path if custom else None
+        self._porcupine = _get_porcupine(self.access_key, keyword_path, self.sensitivity)
+        
+        if self.verify_sensitivity is not None:
+            if self.verify_keyword_path and os.path.exists(self.verify_keyword_path):
+                keyword_path = self.verify_keyword_path
+            self._verifier = _get_porcupine(self.access_key, keyword_path, self.verify_sensitivity)
+            if self._verifier is self._porcupine:
+                # Replaying history would corrupt stage 1's own stream state
+                self._verifier = None
+                raise ValueError("verify_sensitivity must differ from sensitivity for the same wake word")
+    
+    @classmethod
+    def shutdown(cls):
+        """Release all cached Porcupine engines (call once at process exit)."""
+        while _PORCUPINE_ENGINES:
+            _, engine = _PORCUPINE_ENGINES.popitem()
+            engine.delete()
+    
+    def _initialize_audio(self):
+        """Open the microphone in callback mode (not started yet)."""
+        sample_rate = self._porcupine.sample_rate
+        blocksize = self._porcupine.frame_length * FRAMES_PER_BUFFER
+        self._ring = np.zeros((MAX_PENDING_BUFFERS, blocksize), dtype=np.int16)
+        self._write_seq = self._read_seq = 0
+        
+        if sd is not None:
+            # latency="low" asks PortAudio for the device's low-latency buffer
+            self._audio_stream = sd.RawInputStream(
+                samplerate=sample_rate,
+                blocksize=blocksize,
+                dtype="int16",
+                channels=1,
+                latency="low",
+                callback=self._on_sd_frame,
             )
-            logger.info(f"Loaded custom wake word from: {self.keyword_path}")
+            backend = "sounddevice"
         else:
-            # Use built-in keyword as fallback
-            # Available built-in keywords: alexa, americano, blueberry, bumblebee, 
-            # computer, grapefruit, grasshopper, hey google, hey siri, jarvis, ok google, 
-            # picovoice, porcupine, terminator
-            self._porcupine = pvporcupine.create(
-                access_key=self.access_key,
-                keywords=["jarvis"],  # Using "jarvis" as fallback - replace with custom Melissa
-                sensitivities=[self.sensitivity]
-            )
-            logger.warning(
-                "No custom 'Melissa' wake word file found. Using 'jarvis' as fallback. "
-                "Create a custom wake word at https://console.picovoice.ai/ppn"
+            self._pa = pyaudio.PyAudio()
+            self._audio_stream = self._pa.open(
+                rate=sample_rate,
+                channels=1,
+                format=pyaudio.paInt16,
+                input=True,
+                frames_per_buffer=blocksize,
+                stream_callback=self._on_pa_frame,
+                start=False,
             )
-    
-    def _initialize_audio(self):
-        """Initialize PyAudio for microphone input."""
-        self._pa = pyaudio.PyAudio()
-        self._audio_stream = self._pa.open(
-            rate=self._porcupine.sample_rate,
-            channels=1,
-            format=pyaudio.paInt16,
-            input=True,
-            frames_per_buffer=self._porcupine.frame_length
-        )
+            backend = "pyaudio"
         logger.info(
-            f"Audio initialized - Sample rate: {self._porcupine.sample_rate}, "
+            f"Audio initialized ({backend}) - Sample rate: {sample_rate}, "
             f"Frame length: {self._porcupine.frame_length}"
         )
     
+    def _is_voiced(self, pcm: np.ndarray) -> bool:
+        """Cheap energy check deciding whether a frame is worth running Porcupine on."""
+        if self._vad_ratio is None:
+            return True
+        
+        # Mean-square energy in one vectorized dot product; int64 so a full-scale
+        # frame (512 * 32768**2) can't overflow the accumulator
+        samples = pcm.astype(np.int64)
+        energy = int(np.dot(samples, samples)) // len(samples)
+        if energy > max(self._noise_floor, MIN_NOISE_FLOOR) * self._vad_ratio:
+            self._hangover = VAD_HANGOVER_FRAMES
+            voiced = True
+        elif self._hangover:
+            self._hangover -= 1
+            voiced = True
+        else:
+            voiced = False
+        
+        if energy < self._noise_floor:
+            self._noise_floor = energy
+        else:
+            self._noise_floor += (energy - self._noise_floor) * NOISE_FLOOR_RISE
+        return voiced
+    
+    def _verify(self, history: deque) -> bool:
+        """Second stage: re-run recent audio through the stricter engine."""
+        verify = self._verifier.process
+        return any(verify(pcm.tolist()) >= 0 for pcm in history)
+    
+    def _push_buffer(self, samples: np.ndarray, overflow: bool):
+        """Copy a captured buffer into the ring and wake the detector (callback thread)."""
+        if overflow:
+            self._overflows += 1
+        self._ring[self._write_seq % MAX_PENDING_BUFFERS] = samples
+        self._write_seq += 1
+        if (self._write_seq - self._read_seq) * FRAMES_PER_BUFFER >= DISPATCH_BATCH_FRAMES \
+                and not self._frame_ready.is_set():
+            self._loop.call_soon_threadsafe(self._frame_ready.set)
+    
+    def _on_sd_frame(self, indata, frames, time_info, status):
+        """sounddevice callback: indata is only valid during the call, so it's copied."""
+        self._push_buffer(np.frombuffer(indata, dtype=np.int16), status.input_overflow)
+    
+    def _on_pa_frame(self, in_data, frame_count, time_info, status):
+        """PyAudio callback."""
+        self._push_buffer(
+            np.frombuffer(in_data, dtype=np.int16),
+            bool(status & pyaudio.paInputOverflow),
+        )
+        return (None, pyaudio.paContinue)
+    
     async def start(
         self,
         on_wake_word: Callable[[], None],
-        loop_delay: float = 0.01
+        loop_delay: float = 0.0
     ):
         """
         Start listening for the wake word.
         
+        PortAudio delivers frames from its own capture thread into a
+        preallocated ring; this coroutine wakes up when frames arrive and
+        runs them through Porcupine, so capture timing never depends on Python.
+        
         Args:
             on_wake_word: Callback function to call when wake word is detected.
-            loop_delay: Small delay between audio processing loops to prevent CPU hogging.
+            loop_delay: Deprecated and ignored; kept for backwards compatibility.
         """
+        self._loop = asyncio.get_running_loop()
+        self._frame_ready = asyncio.Event()
+        self._overflows = 0
+        
         self._initialize_porcupine()
         self._initialize_audio()
         self._running = True
+        if sd is not None:
+            self._audio_stream.start()
+        else:
+            self._audio_stream.start_stream()
         
         logger.info("🎤 Wake word detection started. Say 'Melissa' (or 'Jarvis' if using fallback)...")
         
+        ring = self._ring
+        process = self._porcupine.process
+        frame_length = self._porcupine.frame_length
+        # Frames skipped by the energy gate, replayed when it opens
+        preroll = deque(maxlen=VAD_PREROLL_FRAMES)
+        # Recent frames (gated or not) for the verification stage
+        history = deque(maxlen=VERIFY_HISTORY_FRAMES) if self._verifier else None
+        reported_overflows = 0
         try:
             while self._running:
-                # Read audio frame
-                pcm = self._audio_stream.read(
-                    self._porcupine.frame_length,
-                    exception_on_overflow=False
-                )
-                pcm = struct.unpack_from("h" * self._porcupine.frame_length, pcm)
+                await self._frame_ready.wait()
+                self._frame_ready.clear()
                 
-                # Process audio for wake word
-                keyword_index = self._porcupine.process(pcm)
+                if self._overflows != reported_overflows:
+                    reported_overflows = self._overflows
+                    logger.warning("Audio input overflow (%d so far)", reported_overflows)
                 
-                if keyword_index >= 0:
-                    logger.info("✨ Wake word detected!")
-                    on_wake_word()
-                
-                # Small delay to prevent CPU hogging
-                await asyncio.sleep(loop_delay)
+                while self._running and self._read_seq < self._write_seq:
+                    if self._write_seq - self._read_seq >= MAX_PENDING_BUFFERS:
+                        # Fell a full ring behind; skip to the oldest slot that
+                        # isn't being overwritten by the next callback
+                        self._read_seq = self._write_seq - MAX_PENDING_BUFFERS + 1
+                    seq = self._read_seq
+                    self._read_seq += 1
+                    # Copy the slot out so PortAudio can't change it under us, then
+                    # drop it if the producer lapped it while we were copying
+                    buffer = ring[seq % MAX_PENDING_BUFFERS].copy()
+                    if self._write_seq - seq >= MAX_PENDING_BUFFERS:
+                        continue
+                    
+                    # Rows are views into this private copy, safe to keep around
+                    for pcm in buffer.reshape(-1, frame_length):
+                        if history is not None:
+                            history.append(pcm)
+                        if not self._is_voiced(pcm):
+                            preroll.append(pcm)
+                            continue
+                        
+                        # pvporcupine copies the frame through ctypes element by
+                        # element; plain ints (tolist, done in C) are its fast path
+                        detected = False
+                        # Gate just opened: let Porcupine hear the quiet lead-in first
+                        while preroll:
+                            detected |= process(preroll.popleft().tolist()) >= 0
+                        detected |= process(pcm.tolist()) >= 0
+                        if not detected:
+                            continue
+                        if history is not None and not self._verify(history):
+                            logger.debug("Wake word candidate rejected by verifier")
+                            continue
+                        logger.info("✨ Wake word detected!")
+                        on_wake_word()
                 
         except KeyboardInterrupt:
             logger.info("Wake word detection stopped by user.")
@@ -145,6 +372,9 @@ class WakeWordDetector:
     def stop(self):
         """Stop the wake word detector and release resources."""
         self._running = False
+        if self._frame_ready:
+            # Wake start() so it notices we're stopping
+            self._frame_ready.set()
         
         if self._audio_stream:
             self._audio_stream.close()
@@ -154,9 +384,9 @@ class WakeWordDetector:
             self._pa.terminate()
             self._pa = None
             
-        if self._porcupine:
-            self._porcupine.delete()
-            self._porcupine = None
+        # The engines themselves stay cached for the next start(); see shutdown()
+        self._porcupine = None
+        self._verifier = None
             
         logger.info("Wake word detector stopped and resources released.")
 
@@ -166,6 +396,8 @@ class WakeWordGate:
     Gate that controls when the agent should listen based on wake word detection.
     
     This integrates with the main agent loop to enable/disable listening.
+    State is a single monotonic deadline in integer nanoseconds, so is_active() is a plain int compare
+    that is cheap enough to poll per audio frame.
     """
     
     def __init__(self, timeout_seconds: float = 30.0):
@@ -174,38 +406,35 @@ class WakeWordGate:
             timeout_seconds: How long to stay active after wake word before going back to sleep.
         """
         self.timeout_seconds = timeout_seconds
-        self._is_active = False
-        self._active_until: float = 0
-        self._lock = asyncio.Lock()
+        self._active_until_ns: int = 0
+        self._activated = asyncio.Event()
         
-    async def activate(self):
+    def activate(self):
         """Activate the gate (called when wake word is detected)."""
-        async with self._lock:
-            self._is_active = True
-            self._active_until = asyncio.get_event_loop().time() + self.timeout_seconds
-            logger.info(f"🟢 Gate activated for {self.timeout_seconds}s")
+        self._active_until_ns = time.monotonic_ns() + int(self.timeout_seconds * 1e9)
+        self._activated.set()
+        logger.info("🟢 Gate activated for %ss", self.timeout_seconds)
     
-    async def deactivate(self):
+    def deactivate(self):
         """Manually deactivate the gate."""
-        async with self._lock:
-            self._is_active = False
-            logger.info("🔴 Gate deactivated")
+        self._active_until_ns = 0
+        self._activated.clear()
+        logger.info("🔴 Gate deactivated")
     
-    async def is_active(self) -> bool:
+    def is_active(self) -> bool:
         """Check if the gate is currently active."""
-        async with self._lock:
-            if self._is_active:
-                current_time = asyncio.get_event_loop().time()
-                if current_time > self._active_until:
-                    self._is_active = False
-                    logger.info("⏰ Gate timed out, going back to sleep")
-            return self._is_active
-    
-    async def extend_timeout(self):
+        return time.monotonic_ns() < self._active_until_ns
+    
+    def extend_timeout(self):
         """Extend the active timeout (call this when user is speaking)."""
-        async with self._lock:
-            if self._is_active:
-                self._active_until = asyncio.get_event_loop().time() + self.timeout_seconds
+        if self.is_active():
+            self._active_until_ns = time.monotonic_ns() + int(self.timeout_seconds * 1e9)
+    
+    async def wait_active(self):
+        """Wait until the gate is activated by the wake word."""
+        while not self.is_active():
+            self._activated.clear()
+            await self._activated.wait()
 
 
 # Standalone test
@@ -226,6 +455,8 @@ if __name__ == "__main__":
     except KeyboardInterrupt:
         print("\nGoodbye!")
         sys.exit(0)
+    finally:
+        WakeWordDetector.shutdown()
 
 
 